@@ -1,87 +1,295 @@
 import os
+import sys
+import atexit
+import queue
 import threading
+import time
 import asyncio
+import concurrent.futures
 import logging
-import traceback
+import logging.handlers
+
+# Configure logging for the Flask app and the bot
+# Records are pushed onto a queue and written to stderr by a listener thread,
+# so logging calls never block the bot's event loop on console I/O.
+# This has to happen before importing the bot, so its basicConfig() call
+# finds the root logger already configured and leaves it alone.
+# The StreamHandler still outputs to Render's console logs.
+# The level comes from LOG_LEVEL (default WARNING) to keep the hot path quiet.
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler(sys.stderr)
+_log_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, _log_handler, respect_handler_level=True)
+
+_log_level = os.environ.get('LOG_LEVEL', 'WARNING').upper()
+_valid_log_level = isinstance(getattr(logging, _log_level, None), int)
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(_log_level if _valid_log_level else logging.WARNING)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener.start()
+# Flush any queued records when the process exits
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger(__name__)
+if not _valid_log_level:
+    logger.warning("Unknown LOG_LEVEL %r, using WARNING", _log_level)
 
 # Import the main bot script
 # Ensure your bot_24_7.py file is in the same directory or accessible via Python path
 # (It should be if they are in the same repository root)
+import bot_24_7
 from bot_24_7 import main_loop
 
-from flask import Flask
-
-# Configure logging for the Flask app itself
-# This will also output to Render's console logs via the StreamHandler
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from flask import Flask, Response
 
 app = Flask(__name__)
 
+# --- Bot thread bookkeeping ---
+# Guards start_bot_thread so exactly one bot thread is spawned per process,
+# no matter how many times (or from where) the startup function is called.
+_bot_started = False
+_bot_lock = threading.Lock()
+bot_thread = None  # Set by start_bot_thread, checked by the health check
+BOT_THREAD_NAME = "bot-thread"
+
+# Set to stop the supervisor in _supervise_bot from restarting the bot
+_shutdown = threading.Event()
+
+# Backoff between bot restarts (seconds), doubled after each failure
+BOT_RESTART_INITIAL_BACKOFF = 5
+BOT_RESTART_MAX_BACKOFF = 300
+# Seconds to wait for the bot to shut down cleanly (Render allows 30s after SIGTERM)
+BOT_SHUTDOWN_TIMEOUT = 25
+
+# The event loop the bot is currently running on (None while it is not running).
+# Only touch it through run_in_bot_loop() from other threads.
+BOT_LOOP = None
+BOT_TASK = None  # The task supervising main_loop on BOT_LOOP, cancelled on shutdown
+BOT_CALL_TIMEOUT = 2  # Default seconds to wait for a coroutine run via run_in_bot_loop
+
+# --- Health check settings ---
+HEALTH_HEARTBEAT_THRESHOLD = 30  # Seconds without a bot heartbeat before reporting unhealthy
+HEALTH_CHECK_TIMEOUT = 0.5  # Max seconds the health check waits for its probes
+# Probes run on a small dedicated pool so a hung probe can't stall the request
+_health_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="health-probe")
+
+async def _supervise_bot():
+    """
+    Runs the bot's main_loop and restarts it with exponential backoff if it
+    stops or crashes, so the Flask server never keeps running without the bot.
+    Restarts happen on this same event loop: the Telegram client is created
+    once per process and Telethon refuses to run on a different loop after
+    its first connection. Publishes the loop as BOT_LOOP and this task as
+    BOT_TASK while it runs.
+    """
+    global BOT_LOOP, BOT_TASK
+    BOT_LOOP = asyncio.get_running_loop()
+    BOT_TASK = asyncio.current_task()
+
+    current = threading.current_thread()
+    current.restart_count = 0
+    backoff = BOT_RESTART_INITIAL_BACKOFF
+    # The heartbeat runs for the whole life of this loop, including the backoff
+    # between restarts: it tracks whether the event loop is responsive, while
+    # crash-looping is handled by the backoff here rather than by Render restarts.
+    heartbeat_task = asyncio.create_task(bot_24_7.heartbeat(), name="heartbeat")
+    try:
+        while not _shutdown.is_set():
+            current.last_restart_ts = time.time()
+            try:
+                await main_loop()
+                logger.warning("Bot main loop returned.")
+            except SystemExit as e:
+                # Catch SystemExit from the bot (e.g. failing to start the client) and restart
+                # Render manages process restarts based on the main process exit code,
+                # which a SystemExit in this thread would never reach.
+                logger.warning("Bot received SystemExit: %s", e)
+            except Exception as e:
+                logger.error("Bot crashed with an error: %s", e, exc_info=True)
+
+            if _shutdown.is_set():
+                break
+
+            # Start over from the initial backoff if the last run stayed up for a while
+            if time.time() - current.last_restart_ts > BOT_RESTART_MAX_BACKOFF:
+                backoff = BOT_RESTART_INITIAL_BACKOFF
+
+            current.restart_count += 1
+            logger.warning("Restarting the bot in %s seconds (restart #%s)...",
+                           backoff, current.restart_count)
+            # stop_bot_thread cancels this task, which also interrupts the sleep
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, BOT_RESTART_MAX_BACKOFF)
+    finally:
+        heartbeat_task.cancel()
+        BOT_LOOP = None
+        BOT_TASK = None
+
+
 # --- Function to run the bot's asyncio loop in a separate thread ---
 # This function will be the target of the new thread
 def run_bot_loop():
     """
-    Sets up a new asyncio event loop and runs the bot's main loop within it.
+    Runs the bot's supervisor in a new asyncio event loop via asyncio.run().
     This runs in a separate thread to not block the Flask web server.
     """
     logger.info("Starting the bot's asyncio loop in a separate thread...")
     try:
-        # Create a new event loop for this thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        # Run the bot's main_loop until it completes (e.g., disconnected, error, or signal)
-        loop.run_until_complete(main_loop())
-
-    except SystemExit as e:
-         # Catch SystemExit from the bot and log it, but don't necessarily kill this thread
-         # Render manages process restarts based on the main process exit code.
-         logger.info(f"Bot thread received SystemExit: {e}")
-         # Depending on desired behavior, you might re-raise or handle differently
-         # raise # Uncomment to allow SystemExit to potentially stop the thread/process
+        # asyncio.run creates one event loop for the lifetime of this thread, runs the
+        # supervised bot until shutdown, and then shuts down async generators and the
+        # default executor and closes the loop.
+        # Keep asyncio debug mode off explicitly; it adds overhead to every callback
+        asyncio.run(_supervise_bot(), debug=False)
     except asyncio.CancelledError:
          logger.info("Bot thread was cancelled.")
     except Exception as e:
-        logger.error(f"Bot thread crashed with an error: {e}", exc_info=True)
-        # If the bot thread crashes, the Flask server remains running,
-        # but the bot functionality is lost. You might want monitoring
-        # or a more robust way to restart the bot thread here.
+        logger.error("Bot thread crashed with an error: %s", e, exc_info=True)
 
     logger.info("Bot thread finished.")
 
 
 # --- Startup Logic to Start the Bot Thread ---
-# The @before_first_request decorator is removed in Flask 2.2+
+# The @before_first_request decorator is removed in Flask 2.2+, so the thread
+# is started from Gunicorn's post_worker_init hook instead.
 def start_bot_thread():
     """
-    Creates and starts the bot thread. This function is called directly
-    when the app module is loaded in the production environment (by Gunicorn).
+    Creates and starts the bot thread. In production this is called from
+    Gunicorn's post_worker_init hook (see gunicorn.conf.py); locally it is
+    called from the __main__ block below.
+    Subsequent calls are no-ops, so only one bot thread ever runs per process.
     """
-    logger.info("Starting bot thread on app module load...")
+    global _bot_started, bot_thread
+    with _bot_lock:
+        if _bot_started:
+            logger.debug("Bot thread already started, skipping.")
+            return
+        # The flag above is per module object. If this file gets evaluated twice
+        # in one process (e.g. as both __main__ and app), look for the other copy's thread.
+        # That thread is driven by the other copy's state (_shutdown, BOT_LOOP, BOT_TASK),
+        # so this copy can't control it: refuse to start another, but don't adopt it.
+        if any(thread.name == BOT_THREAD_NAME for thread in threading.enumerate()):
+            logger.error("A bot thread started by another copy of this module is already "
+                         "running in this process; not starting another.")
+            return
+        _bot_started = True
+
+    logger.info("Starting bot thread...")
     # Create a new thread targeting the run_bot_loop function
-    bot_thread = threading.Thread(target=run_bot_loop)
+    bot_thread = threading.Thread(target=run_bot_loop, name=BOT_THREAD_NAME)
     # Setting daemon=True allows the main Flask process to exit even if this thread is still running
-    # This is generally appropriate for background tasks in web services.
+    # stop_bot_thread() gives it a chance to shut down cleanly first; daemon only matters
+    # if that times out.
     bot_thread.daemon = True
     bot_thread.start()
     logger.info("Bot thread started.")
 
 
+def stop_bot_thread(timeout=BOT_SHUTDOWN_TIMEOUT):
+    """
+    Stops the bot gracefully: prevents further restarts, cancels the bot's
+    main task so its cleanup (cancelling workers, disconnecting the client)
+    runs, and waits up to timeout seconds for the thread to finish.
+    Called from Gunicorn's worker_exit hook and at interpreter exit; safe to call twice.
+    """
+    if _shutdown.is_set():
+        return
+    _shutdown.set()
+
+    loop, task = BOT_LOOP, BOT_TASK
+    if loop is not None and task is not None:
+        logger.info("Stopping the bot...")
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass  # The loop closed in the meantime
+
+    if bot_thread is not None and bot_thread is not threading.current_thread():
+        bot_thread.join(timeout)
+        if bot_thread.is_alive():
+            logger.warning("Bot thread did not stop within %s seconds.", timeout)
+        else:
+            logger.info("Bot thread stopped.")
+
+
+# Runs before the log listener is stopped (atexit handlers run in reverse order)
+atexit.register(stop_bot_thread)
+
+
+# --- Thread-safe Bridge to the Bot ---
+# This is the only safe entry point for code outside the bot thread (e.g. Flask
+# routes) to run bot coroutines. Code inside the bot keeps using plain await.
+def run_in_bot_loop(coro, timeout=BOT_CALL_TIMEOUT):
+    """
+    Runs a coroutine on the bot's event loop from another thread and returns
+    its result. Raises RuntimeError if the bot is not running, and
+    concurrent.futures.TimeoutError if it takes longer than timeout seconds.
+    """
+    loop = BOT_LOOP
+    if loop is None or loop.is_closed():
+        coro.close()  # Avoid a "coroutine was never awaited" warning
+        raise RuntimeError("Bot event loop is not running")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+# --- Health Probes ---
+def _bot_thread_alive():
+    """True if the bot thread exists and is running."""
+    return bot_thread is not None and bot_thread.is_alive()
+
+
+def _bot_heartbeat_fresh():
+    """True if the bot's event loop has sent a heartbeat recently."""
+    return time.monotonic() - bot_24_7.last_heartbeat < HEALTH_HEARTBEAT_THRESHOLD
+
+
+def bot_is_healthy():
+    """
+    Runs all health probes concurrently and returns True only if every probe
+    passes within HEALTH_CHECK_TIMEOUT seconds.
+    """
+    probes = [_health_executor.submit(_bot_thread_alive),
+              _health_executor.submit(_bot_heartbeat_fresh)]
+    try:
+        for future in concurrent.futures.as_completed(probes, timeout=HEALTH_CHECK_TIMEOUT):
+            if not future.result():
+                return False
+    except concurrent.futures.TimeoutError:
+        logger.warning("Health check timed out after %s seconds", HEALTH_CHECK_TIMEOUT)
+        return False
+    return True
+
+
 # --- Flask Routes (for Health Checks and basic Web Service presence) ---
+# The health responses are built once at import and returned as-is on every request.
+# Nothing mutates them, so Flask can safely reuse the same objects.
+_HEALTHY_RESPONSE = Response(b"ok", status=200, mimetype="text/plain")
+_UNHEALTHY_RESPONSE = Response(b"unhealthy", status=503, mimetype="text/plain")
+
 @app.route('/')
 def index():
     """
     A simple route to indicate the web service is running.
-    Used by Render for health checks.
+    Used by Render for health checks, so it returns 503 when the bot thread
+    is not running or its event loop stopped sending heartbeats, and Render
+    can restart the service.
     """
     logger.debug("Received request to /")
-    # You could add checks here (e.g., is bot_thread alive?) for a more robust health check
-    return "Telegram Bot is running in the background!"
+    if not bot_is_healthy():
+        return _UNHEALTHY_RESPONSE
+    return _HEALTHY_RESPONSE
 
 # --- Main Execution Block (for local testing) ---
 # This block is NOT executed by Gunicorn on Render.
+# On Render the app is started with: gunicorn -c gunicorn.conf.py app:app
 if __name__ == '__main__':
     logger.info("Running Flask app locally...")
     # Get the port from the environment variable provided by Render (or default to 5000)
@@ -97,8 +305,3 @@ if __name__ == '__main__':
     # host='0.0.0.0' is needed to listen on all interfaces for Render.
     # debug=False is recommended when running threads to avoid unexpected behavior.
     app.run(host='0.0.0.0', port=port, debug=False)
-
-# --- Call the startup function directly at module level ---
-# This code runs when the app.py module is imported by Gunicorn (production)
-# This is the replacement for the deprecated @app.before_first_request
-start_bot_thread()
@@ -29,13 +29,21 @@ from telethon.tl.functions.messages import ImportChatInviteRequest
 
 # Configure logging
 # Removed file handler as Render's free tier has ephemeral filesystem
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler() # Logs to stdout/stderr, captured by Render
-    ]
-)
+# Per-message logs are DEBUG; set LOG_LEVEL=INFO or DEBUG to see more
+# Under app.py the root logger is already configured (and LOG_LEVEL resolved)
+# before this module is imported, so this only applies to standalone runs.
+if not logging.getLogger().handlers:
+    _requested_log_level = os.environ.get('LOG_LEVEL', 'WARNING').upper()
+    _valid_log_level = isinstance(getattr(logging, _requested_log_level, None), int)
+    logging.basicConfig(
+        level=_requested_log_level if _valid_log_level else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler() # Logs to stdout/stderr, captured by Render
+        ]
+    )
+    if not _valid_log_level:
+        logging.getLogger(__name__).warning("Unknown LOG_LEVEL %r, using WARNING", _requested_log_level)
 logger = logging.getLogger(__name__)
 
 # --- Constants ---
@@ -48,6 +56,9 @@ DOWNLOAD_CHUNK_SIZE = 1024 * 1024 * 2  # 2MB chunks for faster downloads (increa
 DOWNLOAD_TIMEOUT = 600  # 10 minutes timeout for downloads (doubled)
 OPERATION_DELAY = 0.5  # Further reduced delay between operations (seconds)
 SUGGESTION_CHANNEL = "https://t.me/Thestudydimension"  # Channel to suggest for invalid inputs
+DISCONNECT_TIMEOUT = 10  # Max seconds to wait for the Telegram client to disconnect on shutdown
+WORKER_CANCEL_TIMEOUT = 5  # Max seconds to wait for cancelled worker tasks to finish
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeat updates (read by app.py's health check)
 
 # --- API credentials and Passwords from Environment Variables ---
 API_ID = os.environ.get('TELEGRAM_API_ID')
@@ -69,11 +80,14 @@ os.makedirs('downloads', exist_ok=True)
 # --- Tracked data in memory (Still ephemeral on Render free tier) ---
 user_data = {}  # Store user data
 processed_message_ids = set()  # Track processed message IDs to avoid duplicates
+last_heartbeat = time.monotonic()  # Touched by heartbeat() while the bot's event loop is responsive
 # active_links = set() # Removed as queue manages concurrency
 
 
 # --- Queue System Variables ---
-process_queue = asyncio.Queue()
+# The queue is created inside run_bot() so it always belongs to the event loop
+# that is actually running the bot (app.py runs it in its own thread/loop).
+process_queue: Optional[asyncio.Queue] = None
 MAX_WORKERS = 3 # Configure the number of concurrent message processing tasks
 
 # --- Global Telegram Client (accessible by handlers and workers) ---
@@ -222,25 +236,30 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 # --- New Async Functions for Queue Worker and Task Processing ---
 
-async def worker():
-    """Asyncio worker task to process items from the queue."""
+async def worker(queue: asyncio.Queue):
+    """
+    Asyncio worker task to process items from the queue.
+    The queue is passed in rather than read from the global process_queue, which
+    run_bot() replaces on every run, so a worker outliving its run never touches
+    the next run's queue.
+    """
     logger.info("Worker task started...")
     while True:
         # Get an item from the queue. This will wait if the queue is empty.
-        item = await process_queue.get()
+        item = await queue.get()
 
         if item is None: # Sentinel value to signal shutdown
             logger.info("Worker received shutdown signal.")
-            process_queue.task_done()
+            queue.task_done()
             break
 
         chat_username, message_id, user_id, event_object = item
 
         try:
-            logger.info(f"Worker processing link: {chat_username}/{message_id} for user {user_id}")
+            logger.debug("Worker processing link: %s/%s for user %s", chat_username, message_id, user_id)
             # Call the function that does the actual processing
             await process_message_link_task(chat_username, message_id, user_id, event_object)
-            logger.info(f"Worker finished processing link: {chat_username}/{message_id}")
+            logger.debug("Worker finished processing link: %s/%s", chat_username, message_id)
 
         except Exception as e:
             logger.error(f"Error in worker processing {chat_username}/{message_id}: {e}", exc_info=True)
@@ -254,7 +273,7 @@ async def worker():
 
         finally:
             # Signal that the queue item is done
-            process_queue.task_done()
+            queue.task_done()
 
 
 async def process_message_link_task(chat_username: str, message_id: int, user_id: int, event: events.NewMessage.Event):
@@ -321,7 +340,7 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
 
         # Process the message content
         if message.media:
-            logger.info(f"Task found media content in message {message_id}")
+            logger.debug("Task found media content in message %s", message_id)
 
             # Try all forwarding methods in sequence
             try:
@@ -329,7 +348,7 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
 
                  # Attempt 1: Standard optimized forward
                  try:
-                     logger.info(f"Task attempting optimized direct forward of message {message_id}")
+                     logger.debug("Task attempting optimized direct forward of message %s", message_id)
                      # Using background=True allows the worker to potentially get the next item
                      # while forwarding happens in the background.
                      result = await client.forward_messages(
@@ -341,14 +360,14 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
 
                      if result:
                          forwarded = True
-                         logger.info(f"Task: Optimized direct forward successful")
+                         logger.debug("Task: Optimized direct forward successful")
                  except Exception as e:
                      logger.warning(f"Task: Optimized forward failed: {e}")
 
                  # Attempt 2: ID-based forward
                  if not forwarded:
                      try:
-                         logger.info(f"Task attempting ID-based forward for message {message_id}")
+                         logger.debug("Task attempting ID-based forward for message %s", message_id)
                          result = await client.forward_messages(
                              entity=user_id,
                              messages=message.id,
@@ -358,14 +377,14 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
                          )
                          if result:
                              forwarded = True
-                             logger.info(f"Task: ID-based forward successful")
+                             logger.debug("Task: ID-based forward successful")
                      except Exception as e:
                          logger.warning(f"Task: ID-based forward failed: {e}")
 
                  # Attempt 3: Direct message copy (sends the message object itself)
                  if not forwarded:
                      try:
-                         logger.info(f"Task attempting direct message copy for {message_id}")
+                         logger.debug("Task attempting direct message copy for %s", message_id)
                          result = await client.send_message(
                              entity=user_id,
                              message=message,
@@ -373,13 +392,13 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
                          )
                          if result:
                              forwarded = True
-                             logger.info(f"Task: Direct message copy successful")
+                             logger.debug("Task: Direct message copy successful")
                      except Exception as e:
                          logger.warning(f"Task: Message copy failed: {e}")
 
                  # Attempt 4: Media clone (downloads and re-uploads) - Slower, resource intensive
                  if not forwarded and hasattr(message, 'media') and message.media:
-                     logger.info(f"Task attempting media clone for message {message_id}")
+                     logger.debug("Task attempting media clone for message %s", message_id)
                      # This can be resource intensive (RAM/CPU) and might hit ephemeral disk
                      try:
                          result = await client.send_file(
@@ -388,13 +407,13 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
                              caption=message.text if message.text else None,
                              # file_size=message.media.size, # Optional, might help progress
                              # chunk_size=DOWNLOAD_CHUNK_SIZE, # Not directly on send_file, part of Telethon's internal download
-                             progress_callback=lambda current, total: logger.debug(f"Download progress: {current}/{total} for {message_id}"), # Optional progress logging
+                             progress_callback=lambda current, total: logger.debug("Download progress: %s/%s for %s", current, total, message_id), # Optional progress logging
                              background=True
                          )
 
                          if result:
                              forwarded = True
-                             logger.info(f"Task: Media clone successful")
+                             logger.debug("Task: Media clone successful")
                      except TimedOutError:
                          logger.warning(f"Task: Media clone timed out for {message_id}")
                          await event.reply("⏳ File transfer timed out. Please try again.")
@@ -438,7 +457,7 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
                  )
 
                  if forwarded:
-                     logger.info(f"Task forwarded text message for {message_id}")
+                     logger.debug("Task forwarded text message for %s", message_id)
                      # Optional: await event.reply("✅ Message forwarded successfully!")
                      pass
                  else:
@@ -448,7 +467,7 @@ async def process_message_link_task(chat_username: str, message_id: int, user_id
                          user_id,
                          header + text_content
                      )
-                     logger.info(f"Task sent text message as new message for {message_id}")
+                     logger.debug("Task sent text message as new message for %s", message_id)
                      # Optional: await event.reply("✅ Message text sent successfully!")
                      pass
 
@@ -475,21 +494,21 @@ async def start_handler(event):
     # Anti-duplicate protection - ignore if same command processed recently (KEEP THIS)
     current_time = time.time()
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Ignoring duplicate /start command from user {user_id}")
+        logger.debug("Ignoring duplicate /start command from user %s", user_id)
         return
     last_command_time[user_id] = current_time
 
-    logger.info(f"Received /start command from user {user_id}")
+    logger.debug("Received /start command from user %s", user_id)
 
     try:
         # Skip if user is blocked (KEEP THIS, based on ephemeral data)
         if user_id in user_data.get("blocked", []):
-            logger.info(f"User {user_id} is blocked, ignoring /start command")
+            logger.debug("User %s is blocked, ignoring /start command", user_id)
             return
 
         # Check if user is authorized (admin or owner - based on ephemeral data)
         if not is_authorized(user_id):
-            logger.info(f"User {user_id} is not authorized, sending auth request")
+            logger.debug("User %s is not authorized, sending auth request", user_id)
             # Send ONE authorization request message
             try:
                 await event.reply(
@@ -503,7 +522,7 @@ async def start_handler(event):
         # Get user info
         user = await event.get_sender()
         name = getattr(user, 'first_name', 'there')
-        logger.info(f"User {user_id} ({name}) is authorized, sending welcome message")
+        logger.debug("User %s (%s) is authorized, sending welcome message", user_id, name)
 
         # Add user to database if not already present (Still ephemeral)
         user_id_int = user_id # Use integer key for user_data consistency
@@ -558,11 +577,11 @@ async def help_handler(event):
     # Anti-duplicate protection (KEEP THIS)
     current_time = time.time()
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Ignoring duplicate /help command from user {user_id}")
+        logger.debug("Ignoring duplicate /help command from user %s", user_id)
         return
     last_command_time[user_id] = current_time
 
-    logger.info(f"Received /help command from user {user_id}")
+    logger.debug("Received /help command from user %s", user_id)
 
     try:
         # Skip if user is blocked (KEEP THIS)
@@ -618,11 +637,11 @@ async def status_handler(event):
     # Anti-duplicate protection (KEEP THIS)
     current_time = time.time()
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Ignoring duplicate /status command from user {user_id}")
+        logger.debug("Ignoring duplicate /status command from user %s", user_id)
         return
     last_command_time[user_id] = current_time
 
-    logger.info(f"Received /status command from user {user_id}")
+    logger.debug("Received /status command from user %s", user_id)
 
     try:
         # Skip if user is blocked (KEEP THIS)
@@ -722,11 +741,11 @@ async def users_handler(event):
     # Anti-duplicate protection (KEEP THIS)
     current_time = time.time()
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Ignoring duplicate users list request from user {user_id}")
+        logger.debug("Ignoring duplicate users list request from user %s", user_id)
         return
     last_command_time[user_id] = current_time
 
-    logger.info(f"Received users list request from user {user_id}")
+    logger.debug("Received users list request from user %s", user_id)
 
     # Only owners can see the users list (Based on ephemeral data)
     if user_id not in user_data.get("owners", []):
@@ -788,11 +807,11 @@ async def remove_user_handler(event):
     # Anti-duplicate protection (KEEP THIS)
     current_time = time.time()
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Ignoring duplicate remove request from user {user_id}")
+        logger.debug("Ignoring duplicate remove request from user %s", user_id)
         return
     last_command_time[user_id] = current_time
 
-    logger.info(f"Received remove user request from user {user_id}")
+    logger.debug("Received remove user request from user %s", user_id)
 
     # Only owners can remove users (Based on ephemeral data)
     if user_id not in user_data.get("owners", []):
@@ -850,22 +869,22 @@ async def message_handler(event):
     # If we've seen a message from this user in the last 20 seconds, silently ignore it
     # This extremely strict limit should prevent all flood wait errors related to receiving messages.
     if user_id in last_command_time and (current_time - last_command_time.get(user_id, 0)) < 3:
-        logger.info(f"Strict spam protection: Ignoring message from user {user_id}")
+        logger.debug("Strict spam protection: Ignoring message from user %s", user_id)
         return
     last_command_time[user_id] = current_time # Update last command time for ANY incoming message
 
     # Log all incoming messages for debugging
-    logger.info(f"Received message from user {user_id}: {message_text[:100]}...") # Log a bit more
+    logger.debug("Received message from user %s: %s...", user_id, message_text[:100]) # Log a bit more
 
     # Skip if user is blocked (KEEP THIS)
     if user_id in user_data.get("blocked", []):
-        logger.info(f"User {user_id} is blocked, ignoring message")
+        logger.debug("User %s is blocked, ignoring message", user_id)
         return
 
     # --- Handle Authentication for New Users ---
     # If the user is NOT authorized based on the ephemeral user_data
     if not is_authorized(user_id):
-        logger.info(f"User {user_id} is not authorized, checking for password...")
+        logger.debug("User %s is not authorized, checking for password...", user_id)
 
         # Check if the message text matches the environment variable passwords
         # Use secrets.compare_digest for constant-time comparison to prevent timing attacks
@@ -967,7 +986,7 @@ async def message_handler(event):
             return # Stop processing this message after successful auth
 
         # If it's not a password and the user isn't authorized
-        logger.info(f"User {user_id} is not authorized and did not provide a correct password.")
+        logger.debug("User %s is not authorized and did not provide a correct password.", user_id)
         # The initial /start handler already prompts for password if unauthorized.
         # Avoid sending repetitive "Enter password" messages here due to strict anti-spam.
         return # Important: stop processing if not authorized and not a password attempt
@@ -1019,7 +1038,7 @@ async def message_handler(event):
             # Pass the event object so the worker can respond to the original message
             await process_queue.put((chat_username, message_id, user_id, event))
 
-            logger.info(f"Added link {chat_username}/{message_id} for user {user_id} to queue. Queue size: {process_queue.qsize()}")
+            logger.debug("Added link %s/%s for user %s to queue. Queue size: %s", chat_username, message_id, user_id, process_queue.qsize())
 
             # --- END OF QUEUE ADDITION ---
 
@@ -1051,7 +1070,7 @@ async def message_handler(event):
         # Not a Telegram link
         # Skip if the message was a command that fell through authorization (like /users, /remove if not owner)
         if message_text.startswith('/'):
-             logger.info(f"Ignoring unauthorized or invalid command from user {user_id}")
+             logger.debug("Ignoring unauthorized or invalid command from user %s", user_id)
              return # Stop processing commands not explicitly handled or authorized
 
         # Respond to non-link, non-command messages
@@ -1072,52 +1091,61 @@ async def run_bot():
     user_data = load_user_data()
     # Passwords are now from env vars, removed load_passwords()
 
-    # Create the Telegram client with optimized settings
-    
+    # Create the processing queue on the running loop, before connecting: Telethon
+    # dispatches updates to the handlers as soon as it connects. A queue created at
+    # import time (or by a previous run) would be bound to a different event loop.
+    global process_queue
+    process_queue = asyncio.Queue()
+
+    # Workers and keep-alive are started below; the shutdown logic in `finally`
+    # only cleans up what was actually started.
+    workers = []
+    keep_alive_task = None
+    cancelled = False
 
-    # Connect and start the bot
     try:
-        await client.start(bot_token=BOT_TOKEN)
-        logger.info("Telegram client started successfully.")
-    except Exception as e:
-        logger.critical(f"Fatal error starting Telegram client: {e}", exc_info=True)
-        # Exit with non-zero code to signal failure to Render
-        sys.exit(1)
+        # Connect and start the bot
+        # This is inside the try so a cancel or failure mid-connect still disconnects
+        try:
+            await client.start(bot_token=BOT_TOKEN)
+            logger.info("Telegram client started successfully.")
+        except Exception as e:
+            logger.critical(f"Fatal error starting Telegram client: {e}", exc_info=True)
+            # Exit with non-zero code to signal failure to Render
+            sys.exit(1)
 
 
-    # Get the bot's info
-    try:
-        bot_info = await client.get_me()
-        logger.info(f"Bot started: @{bot_info.username} (ID: {bot_info.id})")
-    except Exception as e:
-         logger.error(f"Could not fetch bot info: {e}")
-         # Continue running, but log the error
+        # Get the bot's info
+        try:
+            bot_info = await client.get_me()
+            logger.info(f"Bot started: @{bot_info.username} (ID: {bot_info.id})")
+        except Exception as e:
+             logger.error(f"Could not fetch bot info: {e}")
+             # Continue running, but log the error
 
-    # Track the last command time for each user to prevent duplicates
-    # (This variable is local to run_bot, needs to be shared if handlers are separate)
-    # As handlers are decorated methods, they should share this.
-    # For simplicity, let's assume it's accessed via closure or passed if refactored heavily.
-    # In this current structure, the decorated handlers are methods of an implicit class managed by telethon,
-    # and they access run_bot's scope or globals. Using a global `last_command_time` is safer.
-    global last_command_time # Declare as global to be safe
-    last_command_time = {}
+        # Track the last command time for each user to prevent duplicates
+        # (This variable is local to run_bot, needs to be shared if handlers are separate)
+        # As handlers are decorated methods, they should share this.
+        # For simplicity, let's assume it's accessed via closure or passed if refactored heavily.
+        # In this current structure, the decorated handlers are methods of an implicit class managed by telethon,
+        # and they access run_bot's scope or globals. Using a global `last_command_time` is safer.
+        global last_command_time # Declare as global to be safe
+        last_command_time = {}
 
 
-    # --- Start the worker tasks ---
-    workers = []
-    for i in range(MAX_WORKERS):
-        # asyncio.create_task schedules the coroutine to run soon
-        worker_task = asyncio.create_task(worker(), name=f"worker-{i+1}")
-        workers.append(worker_task)
-        logger.info(f"Started worker task {i+1}/{MAX_WORKERS}")
-    # --- END START WORKERS ---
+        # --- Start the worker tasks ---
+        for i in range(MAX_WORKERS):
+            # asyncio.create_task schedules the coroutine to run soon
+            worker_task = asyncio.create_task(worker(process_queue), name=f"worker-{i+1}")
+            workers.append(worker_task)
+            logger.info(f"Started worker task {i+1}/{MAX_WORKERS}")
+        # --- END START WORKERS ---
 
 
-    # Start keep-alive task
-    keep_alive_task = asyncio.create_task(keep_alive())
+        # Start keep-alive task
+        keep_alive_task = asyncio.create_task(keep_alive())
 
 
-    try:
         # Run the client until disconnected
         # This keeps the bot connected and listening for events
         logger.info("Client running until disconnected...")
@@ -1126,6 +1154,8 @@ async def run_bot():
 
     except asyncio.CancelledError:
          logger.info("Bot task was cancelled.")
+         cancelled = True
+         raise # Propagate so main_loop stops instead of restarting; cleanup below still runs
     except Exception as e:
         logger.critical(f"Bot client crashed with an unhandled exception: {e}", exc_info=True)
         # Exit with non-zero code to signal failure to Render
@@ -1143,36 +1173,51 @@ async def run_bot():
              except asyncio.CancelledError:
                   pass # Expected
 
+        if cancelled:
+            # Cancelled means the process is shutting down (e.g. SIGTERM on a deploy) and
+            # will be killed shortly, so don't wait for in-flight downloads/forwards:
+            # close the connection right away, before waiting on anything else.
+            # The queued items are dropped; the workers are cancelled below.
+            logger.info("Shutting down: Dropping %s queued items...", process_queue.qsize())
+            await disconnect_client()
+
         # --- Add Queue Shutdown Logic ---
-        logger.info(f"Shutting down: Waiting for queue to empty ({process_queue.qsize()} items left)...")
-        try:
-            # Add sentinel values (None) to the queue to signal workers to stop gracefully
-            for _ in range(MAX_WORKERS):
-                await process_queue.put(None)
+        elif workers:
+            logger.info(f"Shutting down: Waiting for queue to empty ({process_queue.qsize()} items left)...")
+            try:
+                # Add sentinel values (None) to the queue to signal workers to stop gracefully
+                for _ in range(MAX_WORKERS):
+                    await process_queue.put(None)
 
-            # Wait for the queue to be fully processed (workers finish current tasks and process sentinels)
-            # Use a timeout to prevent infinite waiting if something goes wrong
-            await asyncio.wait_for(process_queue.join(), timeout=90.0) # Wait up to 90 secs
+                # Wait for the queue to be fully processed (workers finish current tasks and process sentinels)
+                # Use a timeout to prevent infinite waiting if something goes wrong
+                await asyncio.wait_for(process_queue.join(), timeout=90.0) # Wait up to 90 secs
 
-        except asyncio.TimeoutError:
-            logger.warning("Queue did not empty within timeout during shutdown. Some tasks may not have finished.")
-        except Exception as e:
-            logger.error(f"Error during graceful queue shutdown: {e}", exc_info=True)
-        finally:
-             # Ensure worker tasks are cancelled regardless
-             logger.info("Cancelling worker tasks...")
-             for worker_task in workers:
-                 if not worker_task.done():
-                      worker_task.cancel()
-             # Gather tasks to ensure cancellation is processed
-             try:
-                  await asyncio.gather(*workers, return_exceptions=True)
-             except asyncio.CancelledError:
-                  pass # Expected when cancelling
-             logger.info("All workers stopped.")
+            except asyncio.TimeoutError:
+                logger.warning("Queue did not empty within timeout during shutdown. Some tasks may not have finished.")
+            except Exception as e:
+                logger.error(f"Error during graceful queue shutdown: {e}", exc_info=True)
+
+        # Ensure worker tasks are cancelled regardless
+        logger.info("Cancelling worker tasks...")
+        for worker_task in workers:
+            if not worker_task.done():
+                 worker_task.cancel()
+        # Wait (bounded) for the cancellation to be processed
+        if workers:
+            done, pending = await asyncio.wait(workers, timeout=WORKER_CANCEL_TIMEOUT)
+            if pending:
+                logger.warning("%s worker task(s) did not stop within %ss.", len(pending), WORKER_CANCEL_TIMEOUT)
+            else:
+                logger.info("All workers stopped.")
         # --- END Queue Shutdown Logic ---
 
 
+        # Close the Telegram connection cleanly so the session isn't left dangling
+        # (already done above when cancelled)
+        if not cancelled:
+            await disconnect_client()
+
         # Save user data before exiting (Still ephemeral)
         logger.info("Saving user data (ephemeral)...")
         save_user_data()
@@ -1180,6 +1225,19 @@ async def run_bot():
         # Let the script exit, Render will handle restarting if configured
 
 
+async def disconnect_client():
+    """Disconnect the Telegram client if connected, giving up after DISCONNECT_TIMEOUT seconds."""
+    if not client.is_connected():
+        return
+    logger.info("Disconnecting Telegram client...")
+    try:
+        await asyncio.wait_for(client.disconnect(), timeout=DISCONNECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Telegram client did not disconnect within %ss.", DISCONNECT_TIMEOUT)
+    except Exception as e:
+        logger.error("Error disconnecting Telegram client: %s", e, exc_info=True)
+
+
 async def keep_alive():
     """Send periodic pings to keep the connection alive and save data."""
     while True:
@@ -1203,6 +1261,17 @@ async def keep_alive():
             logger.error(f"Error in keep_alive: {e}", exc_info=True)
 
 
+async def heartbeat():
+    """
+    Periodically record that the bot's event loop is alive and not blocked.
+    Run by app.py's supervisor for the whole life of the loop (including restart backoff).
+    """
+    global last_heartbeat
+    while True:
+        last_heartbeat = time.monotonic()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
 # --- Main Entry Point ---
 # This block is primarily used for local testing, app.py runs main_loop directly on Render
 async def main_loop():
@@ -0,0 +1,34 @@
+"""
+Gunicorn configuration for running the Flask app + Telegram bot on Render.
+
+Render start command:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+import sys
+
+# Listen on the port provided by Render (or default to 10000 locally)
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# A single worker, so there is exactly one Telegram client per deploy.
+# Every extra worker would start its own bot against the same account.
+workers = 1
+
+# gthread lets the worker keep answering health checks on its own threads
+# while the bot runs in its background thread.
+worker_class = "gthread"
+threads = 4
+
+
+def post_worker_init(worker):
+    """Start the bot thread once the worker has loaded the app."""
+    from app import start_bot_thread
+    start_bot_thread()
+
+
+def worker_exit(server, worker):
+    """Shut the bot down cleanly before the worker exits (e.g. on SIGTERM during a deploy)."""
+    # This also runs when the worker failed to boot; don't import app.py again then
+    app = sys.modules.get("app")
+    if app is not None:
+        app.stop_bot_thread()